@@ -1,6 +1,14 @@
-import xml.etree.ElementTree as ETree
 import json
-from typing import Dict, List, Any
+import sys
+from collections import defaultdict
+from typing import Dict, DefaultDict, List, Optional, Set, Tuple, Union, Any
+
+try:
+    from lxml import etree as ETree  # type: ignore[import-untyped]
+    USING_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ETree
+    USING_LXML = False
 
 
 class ClassElement:
@@ -12,6 +20,8 @@ class ClassElement:
         is_root (bool): Является ли корневым
         documentation (str): Документация
     """
+    __slots__ = ('name', 'is_root', 'documentation', 'attributes')
+
     def __init__(self, name: str, is_root: bool, documentation: str) -> None:
         self.name: str = name
         self.is_root: bool = is_root
@@ -34,6 +44,11 @@ class Aggregation:
         sourceMultiplicity (str): Мультиплицированность источника
         targetMultiplicity (str): Мультиплицированность цели
     """
+    __slots__ = (
+        'source', 'target', 'sourceMultiplicity', 'targetMultiplicity',
+        'min_mult', 'max_mult'
+    )
+
     def __init__(
         self,
         source: str,
@@ -45,6 +60,10 @@ class Aggregation:
         self.target: str = target
         self.sourceMultiplicity: str = sourceMultiplicity
         self.targetMultiplicity: str = targetMultiplicity
+        if '..' in sourceMultiplicity:
+            self.min_mult, self.max_mult = sourceMultiplicity.split('..', 1)
+        else:
+            self.min_mult = self.max_mult = sourceMultiplicity
 
 class ParserXML:
     """
@@ -57,36 +76,82 @@ class ParserXML:
         self.path: str = path
         self.classes: Dict[str, ClassElement] = {}
         self.aggregations: List[Aggregation] = []
+        self.root_class: Optional[ClassElement] = None
 
     def parse(self) -> None:
         """
         Парсит XML-файл и заполняет классы и агрегации.
+        Файл читается потоково, обработанные элементы очищаются.
+        Учитываются только прямые потомки корневого элемента.
         """
-        root = ETree.parse(self.path).getroot()
-
-        for element in root:
-            if element.tag == 'Class':
-                class_name = element.attrib['name']
-                class_element = ClassElement(
-                    name=class_name,
-                    is_root=element.attrib['isRoot'] == 'true',
-                    documentation=element.attrib.get('documentation', '')
+        options: Dict[str, Any] = {}
+        if USING_LXML:
+            options = {'huge_tree': True, 'tag': ('Class', 'Aggregation')}
+        # Без lxml у элемента нет ссылки на родителя, поэтому разобранные
+        # элементы откладываются и отбираются по корню после разбора
+        pending: List[Tuple[Any, Union[ClassElement, Aggregation]]] = []
+
+        element: Any = None
+        for _, element in ETree.iterparse(self.path, events=('end',), **options):
+            if USING_LXML:
+                parent = element.getparent()
+                if parent is None or parent.getparent() is not None:
+                    continue
+
+            item: Union[ClassElement, Aggregation]
+            tag = element.tag
+            if tag == 'Class':
+                attrib = element.attrib
+                item = ClassElement(
+                    name=sys.intern(attrib['name']),
+                    is_root=attrib['isRoot'] == 'true',
+                    documentation=attrib.get('documentation', '')
                 )
-                for attr in element.findall('Attribute'):
-                    class_element.add_attribute(
-                        name=attr.attrib['name'],
+                for attr in element.iterfind('Attribute'):
+                    item.add_attribute(
+                        name=sys.intern(attr.attrib['name']),
                         type=attr.attrib['type']
                     )
-                self.classes[class_name] = class_element
-
-            elif element.tag == 'Aggregation':
-                aggregation = Aggregation(
-                    source=element.attrib['source'],
-                    target=element.attrib['target'],
-                    sourceMultiplicity=element.attrib['sourceMultiplicity'],
-                    targetMultiplicity=element.attrib['targetMultiplicity']
+            elif tag == 'Aggregation':
+                attrib = element.attrib
+                item = Aggregation(
+                    source=sys.intern(attrib['source']),
+                    target=sys.intern(attrib['target']),
+                    sourceMultiplicity=attrib['sourceMultiplicity'],
+                    targetMultiplicity=attrib['targetMultiplicity']
                 )
-                self.aggregations.append(aggregation)
+            else:
+                continue
+
+            element.clear()
+            if USING_LXML:
+                self._add_item(item)
+                # Удаляем уже обработанные элементы из корня документа
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+            else:
+                pending.append((element, item))
+
+        if pending:
+            # Последнее событие 'end' приходит от корневого элемента
+            top_level = set(element)
+            for child, item in pending:
+                if child in top_level:
+                    self._add_item(item)
+
+        if self.root_class is None:
+            raise Exception('root отсутствует')
+
+    def _add_item(self, item: Union[ClassElement, Aggregation]) -> None:
+        """
+        Добавляет разобранный класс или агрегацию.
+        """
+        if isinstance(item, Aggregation):
+            self.aggregations.append(item)
+            return
+        self.classes[item.name] = item
+        if item.is_root and self.root_class is None:
+            self.root_class = item
 
     def get_classes(self) -> Dict[str, ClassElement]:
         """
@@ -100,29 +165,56 @@ class ParserXML:
         """
         return self.aggregations
 
+    def get_root(self) -> ClassElement:
+        """
+        Возвращает корневой класс.
+        """
+        if self.root_class is None:
+            raise Exception('root отсутствует')
+        return self.root_class
+
+class AggregationIndex:
+    """
+    Индексы по агрегациям, общие для построителей XML и JSON.
+
+    Args:
+        aggregations (List[Aggregation]): Список агрегаций
+    """
+    def __init__(self, aggregations: List[Aggregation]) -> None:
+        children_by_target: DefaultDict[str, List[str]] = defaultdict(list)
+        self.multiplicity_by_source: Dict[str, Tuple[str, str]] = {}
+
+        for aggregation in aggregations:
+            source = aggregation.source
+            children_by_target[aggregation.target].append(source)
+            self.multiplicity_by_source[source] = (aggregation.min_mult, aggregation.max_mult)
+
+        self.children_by_target: Dict[str, List[str]] = dict(children_by_target)
+
 class BuilderXML:
     """
     Класс для построения выходного XML-файла.
     
     Args:
         classes (Dict[str, ClassElement]): Словарь классов
-        aggregations (List[Aggregation]): Список агрегаций
+        aggregation_index (AggregationIndex): Индексы по агрегациям
+        root_class (ClassElement): Корневой класс
     """
-    def __init__(self, classes: Dict[str, ClassElement], aggregations: List[Aggregation]) -> None:
+    def __init__(
+        self,
+        classes: Dict[str, ClassElement],
+        aggregation_index: AggregationIndex,
+        root_class: ClassElement
+    ) -> None:
         self.classes = classes
-        self.aggregations = aggregations
+        self.aggregation_index = aggregation_index
+        self.root_class = root_class
 
     def build(self) -> ETree.ElementTree:
         """
         Строит XML-дерево на основе классов и агрегаций.
         """
-        for class_element in self.classes.values():
-            if class_element.is_root:
-                root_class = class_element
-                break
-        else:
-            raise Exception('root отсутствует')
-
+        root_class = self.root_class
         root_element = ETree.Element(root_class.name)
         self.add_attributes(root_element, root_class)
         self.add_nested(root_element, root_class.name)
@@ -133,19 +225,39 @@ class BuilderXML:
         Добавляет атрибуты к XML-элементу.
         """
         for attr_name, attr_type in class_element.attributes.items():
-            child = ETree.SubElement(element, attr_name)
-            child.text = attr_type
+            ETree.SubElement(element, attr_name).text = attr_type
 
     def add_nested(self, parent_element: ETree.Element, target_class_name: str) -> None:
         """
-        Рекурсивно добавляет вложенные классы.
+        Добавляет вложенные классы, обходя их через явный стек.
+        Классы на текущем пути от корня хранятся в множестве: после обхода
+        поддерева в стек кладётся маркер выхода, убирающий класс из пути.
         """
-        for aggregation in self.aggregations:
-            if aggregation.target == target_class_name:
-                source_class = self.classes[aggregation.source]
-                child_element = ETree.SubElement(parent_element, source_class.name)
-                self.add_attributes(child_element, source_class)
-                self.add_nested(child_element, source_class.name)
+        children_by_target = self.aggregation_index.children_by_target
+        classes = self.classes
+        sub_element = ETree.SubElement
+
+        on_path: Set[str] = set()
+        stack: List[Tuple[Optional[ETree.Element], str]] = [
+            (parent_element, target_class_name)
+        ]
+        push = stack.append
+        while stack:
+            element, class_name = stack.pop()
+            if element is None:
+                on_path.remove(class_name)
+                continue
+            on_path.add(class_name)
+            push((None, class_name))
+            for source_name in children_by_target.get(class_name, ()):
+                if source_name in on_path:
+                    raise Exception(
+                        f'циклическая агрегация: {source_name} вложен сам в себя'
+                    )
+                child_element = sub_element(element, source_name)
+                for attr_name, attr_type in classes[source_name].attributes.items():
+                    sub_element(child_element, attr_name).text = attr_type
+                push((child_element, source_name))
 
 class BuilderJSON:
     """
@@ -153,20 +265,24 @@ class BuilderJSON:
     
     Args:
         classes (Dict[str, ClassElement]): Словарь классов
-        aggregations (List[Aggregation]): Список агрегаций
+        aggregation_index (AggregationIndex): Индексы по агрегациям
     """
     
-    def __init__(self, classes: Dict[str, ClassElement], aggregations: List[Aggregation]) -> None:
+    def __init__(
+        self,
+        classes: Dict[str, ClassElement],
+        aggregation_index: AggregationIndex
+    ) -> None:
         self.classes = classes
-        self.aggregations = aggregations
+        self.aggregation_index = aggregation_index
 
-    def build(self) -> List[dict]:
+    def build(self) -> List[Dict[str, Any]]:
         """
         Строит список словарей для сериализации в JSON.
         """
-        nested_classes = self._get_nested_classes()
-        multiplicities = self._get_multiplicities()
-        json_list = []
+        nested_classes = self.aggregation_index.children_by_target
+        multiplicities = self.aggregation_index.multiplicity_by_source
+        json_list: List[Dict[str, Any]] = []
 
         for class_name, class_element in self.classes.items():
             class_dict = self._build_class_dict(
@@ -179,42 +295,12 @@ class BuilderJSON:
 
         return json_list
 
-    def _get_nested_classes(self) -> Dict[str, List[str]]:
-        """
-        Возвращает словарь вложенных классов.
-        """
-        nested_classes: Dict[str, List[str]] = {}
-        for aggregation in self.aggregations:
-            target = aggregation.target
-            source = aggregation.source
-            if target not in nested_classes:
-                nested_classes[target] = []
-            nested_classes[target].append(source)
-        return nested_classes
-
-    def _get_multiplicities(self) -> Dict[str, Dict[str, str]]:
-        """
-        Возвращает словарь мультиплицирований для классов.
-        """
-        multiplicities: Dict[str, Dict[str, str]] = {}
-        for aggregation in self.aggregations:
-            source = aggregation.source
-            sourceMultiplicity = aggregation.sourceMultiplicity
-
-            if '..' in sourceMultiplicity:
-                min_val, max_val = sourceMultiplicity.split('..')
-            else:
-                min_val = max_val = sourceMultiplicity
-
-            multiplicities[source] = {'min': min_val, 'max': max_val}
-        return multiplicities
-
     def _build_class_dict(
         self,
         class_name: str,
         class_element: ClassElement,
         nested_classes: Dict[str, List[str]],
-        multiplicities: Dict[str, Dict[str, str]]
+        multiplicities: Dict[str, Tuple[str, str]]
     ) -> Dict[str, Any]:
         """
         Формирует словарь для одного класса.
@@ -225,20 +311,20 @@ class BuilderJSON:
             'isRoot': class_element.is_root
         }
 
-        if class_name in multiplicities:
-            class_dict['min'] = multiplicities[class_name]['min']
-            class_dict['max'] = multiplicities[class_name]['max']
-
-        parameters: List[dict] = []
-
-        for attr_name, attr_type in class_element.attributes.items():
-            param = {'name': attr_name, 'type': attr_type}
-            parameters.append(param)
-
-        if class_name in nested_classes:
-            for nested_class_name in nested_classes[class_name]:
-                param = {'name': nested_class_name, 'type': 'class'}
-                parameters.append(param)
+        multiplicity = multiplicities.get(class_name)
+        if multiplicity is not None:
+            class_dict['min'], class_dict['max'] = multiplicity
+
+        # Параметры сразу собираются словарями: промежуточные объекты всё равно
+        # пришлось бы превращать в словари при сериализации
+        parameters: List[Dict[str, str]] = [
+            {'name': attr_name, 'type': attr_type}
+            for attr_name, attr_type in class_element.attributes.items()
+        ]
+        parameters += [
+            {'name': nested_class_name, 'type': 'class'}
+            for nested_class_name in nested_classes.get(class_name, ())
+        ]
 
         class_dict['parameters'] = parameters
         return class_dict
@@ -248,15 +334,15 @@ class Delta:
     Класс для хранения дельты между двумя конфигами.
 
     Args:
-        additions (List[Dict[str, Any]]): Новые параметры
+        additions (Dict[str, Any]): Новые параметры, ключ -> значение
         deletions (List[str]): Удалённые параметры
-        updates (List[Dict[str, Any]]): Изменённые параметры
+        updates (Dict[str, Tuple[Any, Any]]): Изменённые параметры, ключ -> (было, стало)
     """
     def __init__(
         self,
-        additions: List[Dict[str, Any]],
+        additions: Dict[str, Any],
         deletions: List[str],
-        updates: List[Dict[str, Any]]
+        updates: Dict[str, Tuple[Any, Any]]
     ) -> None:
         self.additions = additions
         self.deletions = deletions
@@ -267,9 +353,15 @@ class Delta:
         Преобразует дельту в словарь для сериализации в JSON.
         """
         return {
-            "additions": self.additions,
+            "additions": [
+                {"key": key, "value": value}
+                for key, value in self.additions.items()
+            ],
             "deletions": self.deletions,
-            "updates": self.updates
+            "updates": [
+                {"key": key, "from": old_value, "to": new_value}
+                for key, (old_value, new_value) in self.updates.items()
+            ]
         }
 
     @staticmethod
@@ -280,22 +372,17 @@ class Delta:
         """
         Генерирует дельту между двумя конфигами.
         """
-        additions = []
-        deletions = []
-        updates = []
-
-        for key in new_config:
-            if key not in old_config:
-                additions.append({"key": key, "value": new_config[key]})
-            elif old_config[key] != new_config[key]:
-                updates.append({
-                    "key": key,
-                    "from": old_config[key],
-                    "to": new_config[key]
-                })
-        for key in old_config:
-            if key not in new_config:
-                deletions.append(key)
+        additions = {
+            key: value
+            for key, value in new_config.items()
+            if key not in old_config
+        }
+        deletions = [key for key in old_config if key not in new_config]
+        updates = {
+            key: (old_config[key], value)
+            for key, value in new_config.items()
+            if key in old_config and old_config[key] != value
+        }
         return Delta(additions, deletions, updates)
 
 
@@ -320,11 +407,10 @@ class ConfigPatcher:
         for key in self.delta.deletions:
             result.pop(key, None)
         # Обновления
-        for upd in self.delta.updates:
-            result[upd["key"]] = upd["to"]
+        for key, (_, new_value) in self.delta.updates.items():
+            result[key] = new_value
         # Добавления
-        for add in self.delta.additions:
-            result[add["key"]] = add["value"]
+        result.update(self.delta.additions)
         return result
 
 
@@ -344,28 +430,36 @@ def save_json(path: str, data: Any) -> None:
         json.dump(data, f, indent=4, ensure_ascii=False)
 
 
-if __name__ == "__main__":
-    # Парсинг входного xml
-    parser = ParserXML('input\\impulse_test_input.xml')
-    parser.parse()
-
-    # Тут генерируется и записывается config.xml на основе парсинга входного xml
+def write_config_xml(parser: ParserXML, aggregation_index: AggregationIndex) -> None:
+    """
+    Генерирует и записывает config.xml на основе парсинга входного xml.
+    """
     xml_builder = BuilderXML(
         classes=parser.get_classes(),
-        aggregations=parser.get_aggregations()
+        aggregation_index=aggregation_index,
+        root_class=parser.get_root()
     )
     xml_tree = xml_builder.build()
     ETree.indent(xml_tree, '\t')
     xml_tree.write('out\\config.xml')
 
-    # Тут генерируется и записывается meta.json на основе парсинга входного xml
+
+def write_meta_json(parser: ParserXML, aggregation_index: AggregationIndex) -> None:
+    """
+    Генерирует и записывает meta.json на основе парсинга входного xml.
+    """
     json_builder = BuilderJSON(
         classes=parser.get_classes(),
-        aggregations=parser.get_aggregations()
+        aggregation_index=aggregation_index
     )
     json_data = json_builder.build()
     save_json('out\\meta.json', json_data)
 
+
+def write_delta() -> None:
+    """
+    Генерирует delta.json и применяет дельту к config.json.
+    """
     # Загрузка конфигов
     config = load_json('input\\config.json')
     patched_config = load_json('input\\patched_config.json')
@@ -377,4 +471,24 @@ if __name__ == "__main__":
     # Применение дельты
     patcher = ConfigPatcher(config, delta)
     res_patched = patcher.apply()
-    save_json('out\\res_patched_config.json', res_patched)
\ No newline at end of file
+    save_json('out\\res_patched_config.json', res_patched)
+
+
+def main() -> None:
+    """
+    Запускает полный цикл генерации выходных файлов.
+    """
+    # Парсинг входного xml
+    parser = ParserXML('input\\impulse_test_input.xml')
+    parser.parse()
+    aggregation_index = AggregationIndex(parser.get_aggregations())
+
+    # Этапы выполняются последовательно: построение XML и JSON держит GIL,
+    # и потоки не дают выигрыша. Ошибка на любом этапе останавливает запуск
+    write_config_xml(parser, aggregation_index)
+    write_meta_json(parser, aggregation_index)
+    write_delta()
+
+
+if __name__ == "__main__":
+    main()